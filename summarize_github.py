@@ -4,6 +4,11 @@ import os
 import argparse
 import shelve
 import logging
+import math
+import random
+import re
+import zlib
+from collections import Counter, defaultdict
 from dotenv import load_dotenv
 import openai
 import nltk
@@ -89,7 +94,7 @@ def summarize_chunk(client, model, chunk, prompt_instructions="", max_summary_to
             logger.error(f"An error occurred {i}-th trial: {e}")
     return ""
 
-def text_summarize(text_chunks, serving, model=None, instruction=None, context=None, separator="\n"):
+def text_summarize(text_chunks, serving, model=None, instruction=None, context=None, separator="\n", chunk_groups=None):
     client = openai.OpenAI(api_key=os.getenv(llm_keys[serving]), base_url=llm_urls[serving])
     if model is None:
         assert serving in llm_default_models, f"Default model not found for serving {serving}"
@@ -106,10 +111,19 @@ def text_summarize(text_chunks, serving, model=None, instruction=None, context=N
         start_id = end_id
         # combine chunks until reaching the max_input_tokens
         while num_tokens < max_input_tokens and end_id < len(chunk_num_tokens):
+            # start a new group in the next batch if the whole group would fit there but not here
+            if chunk_groups is not None and end_id > start_id and chunk_groups[end_id] != chunk_groups[end_id - 1]:
+                group_end_id = end_id
+                while group_end_id < len(chunk_groups) and chunk_groups[group_end_id] == chunk_groups[end_id]:
+                    group_end_id += 1
+                group_num_tokens = sum(chunk_num_tokens[end_id:group_end_id])
+                if num_tokens + group_num_tokens > max_input_tokens and instruction_num_tokens + group_num_tokens <= max_input_tokens:
+                    break
             num_tokens += chunk_num_tokens[end_id]
             end_id += 1
         assert end_id > start_id
-        if start_id == end_id - 1 and end_id < len(chunk_num_tokens):
+        # a single chunk may also end a batch early at a group boundary, only truncate when it overflows
+        if start_id == end_id - 1 and end_id < len(chunk_num_tokens) and num_tokens > max_input_tokens:
             logger.warning(f"Chunk {start_id} is too large ({num_tokens}) to fit in the max_tokens ({max_input_tokens}) limit.")
             text = text_chunks[start_id][:max_input_tokens - instruction_num_tokens]
         else:
@@ -339,6 +353,224 @@ def apply_rules(item, rules):
 
     return True
 
+# Title fragments that vary within a family of otherwise identical items, e.g.
+# "DISABLED test_foo_cuda (__main__.TestBar)" or "[flaky] test_baz failed on trunk"
+family_title_patterns = [
+    (re.compile(r"\btest_\w+"), "test_*"),
+    (re.compile(r"\b[0-9a-f]{7,40}\b"), "<sha>"),
+    (re.compile(r"\d+"), "<n>"),
+]
+
+# Auto-generated (bot) titles of disabled/flaky test families, other titles mentioning
+# flakiness are left to the similarity checks
+family_title_pattern = re.compile(r"^(DISABLED|UNSTABLE) test_\w+ \(|^\[flaky\]")
+
+# Scripts written without spaces between words (CJK, kana, hangul)
+cjk_pattern = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens used for clustering.
+    Words containing CJK characters are split into character bigrams.
+    """
+    tokens = []
+    for word in re.findall(r"\w+", text.lower()):
+        if cjk_pattern.search(word):
+            tokens.extend(word[i:i + 2] for i in range(max(len(word) - 1, 1)))
+        else:
+            tokens.append(word)
+    return tokens
+
+# Issue/PR template parts shared by unrelated items: HTML comments, the environment dump
+# ("### Versions" / "Collecting environment information..." up to the next heading),
+# section headings such as "### 🐛 Describe the bug" and "cc @..." lines
+description_boilerplate_patterns = [
+    re.compile(r"<!--.*?-->", re.DOTALL),
+    re.compile(r"^#+\s*(Versions|Environment)\b.*?(?=^#|\Z)", re.DOTALL | re.MULTILINE | re.IGNORECASE),
+    re.compile(r"Collecting environment information.*?(?=^#|\Z)", re.DOTALL | re.MULTILINE),
+    re.compile(r"^#+.*$", re.MULTILINE),
+    re.compile(r"^\s*cc\s+@.*$", re.MULTILINE),
+]
+
+def strip_description_boilerplate(description):
+    """
+    Remove issue/PR template boilerplate from a description.
+    """
+    for pattern in description_boilerplate_patterns:
+        description = pattern.sub("", description)
+    return description
+
+def item_cluster_text(item, max_description_chars=2000):
+    """
+    Build the text of a GitHub item used for clustering: title, tags and (truncated) description
+    without template boilerplate.
+    """
+    description = item.description if item.description != "No description available" else ""
+    description = strip_description_boilerplate(description)
+    return "\n".join([item.title, " ".join(item.tags), description[:max_description_chars]])
+
+def title_similarity(title, other):
+    """
+    Jaccard similarity of the token sets of two titles.
+    """
+    tokens, other_tokens = set(tokenize(title)), set(tokenize(other))
+    if not tokens or not other_tokens:
+        return 0.0
+    return len(tokens & other_tokens) / len(tokens | other_tokens)
+
+def item_family_key(item):
+    """
+    Return a key shared by items of the same auto-generated family (disabled/flaky tests), or None.
+    """
+    if not family_title_pattern.match(item.title):
+        return None
+    key = item.title
+    for pattern, replacement in family_title_patterns:
+        key = pattern.sub(replacement, key)
+    return key if key != item.title else None
+
+def minhash_signature(tokens, num_perm=64, shingle_size=3, seed=1):
+    """
+    Compute the MinHash signature of the word shingles of a token list, or None if there are no tokens.
+    """
+    if not tokens:
+        return None
+    prime = (1 << 61) - 1
+    rng = random.Random(seed)
+    perms = [(rng.randrange(1, prime), rng.randrange(0, prime)) for _ in range(num_perm)]
+    if len(tokens) < shingle_size:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+    return [min((a * h + b) % prime for h in hashes) for a, b in perms]
+
+def tfidf_vectors(token_lists):
+    """
+    Compute L2-normalized TF-IDF vectors (as dicts) for a list of token lists.
+    """
+    doc_freq = Counter()
+    for tokens in token_lists:
+        doc_freq.update(set(tokens))
+    num_docs = len(token_lists)
+    vectors = []
+    for tokens in token_lists:
+        vector = {token: (1 + math.log(count)) * math.log((1 + num_docs) / (1 + doc_freq[token]))
+                  for token, count in Counter(tokens).items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        vectors.append({token: weight / norm for token, weight in vector.items()} if norm > 0 else {})
+    return vectors
+
+def cosine_similarity(vector, other):
+    if len(vector) > len(other):
+        vector, other = other, vector
+    return sum(weight * other.get(token, 0.0) for token, weight in vector.items())
+
+def dedup_items(items, threshold=0.8, title_threshold=0.5, num_perm=64, bands=16):
+    """
+    Collapse near-duplicate GitHub items into groups.
+    Items of the same disabled/flaky test family end up in the same group, as do items whose
+    estimated Jaccard similarity (MinHash with LSH banding) is at least the threshold and whose
+    titles are at least title_threshold similar. Only the representative of a group is sent to
+    the LLM in full, so merging is kept conservative.
+    Returns a list of groups, each being a list of items with the representative first.
+    """
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    families = {}
+    for i, item in enumerate(items):
+        key = item_family_key(item)
+        if key is None:
+            continue
+        if key in families:
+            union(families[key], i)
+        else:
+            families[key] = i
+
+    signatures = [minhash_signature(tokenize(item_cluster_text(item)), num_perm=num_perm) for item in items]
+    rows = num_perm // bands
+    compared = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, signature in enumerate(signatures):
+            # Items without any token cannot be told apart, keep them as singletons
+            if signature is None:
+                continue
+            buckets[tuple(signature[band * rows:(band + 1) * rows])].append(i)
+        for candidates in buckets.values():
+            for k, i in enumerate(candidates):
+                for j in candidates[k + 1:]:
+                    if (i, j) in compared or find(i) == find(j):
+                        continue
+                    compared.add((i, j))
+                    similarity = sum(a == b for a, b in zip(signatures[i], signatures[j])) / num_perm
+                    if similarity >= threshold and title_similarity(items[i].title, items[j].title) >= title_threshold:
+                        union(i, j)
+
+    groups = defaultdict(list)
+    for i, item in enumerate(items):
+        groups[find(i)].append(item)
+    # Prefer the most discussed item as the representative of a group
+    return [sorted(group, key=lambda item: len(item.comments) + len(item.review_comments), reverse=True)
+            for group in groups.values()]
+
+def cluster_items(items, threshold=0.2):
+    """
+    Group GitHub items (or groups of near-duplicate items, represented by their first item)
+    by topic using single-pass TF-IDF clustering over title, tags and description.
+    Returns a list of clusters ordered by size, each being a list of the given elements.
+    """
+    def representative(element):
+        return element[0] if isinstance(element, list) else element
+
+    vectors = tfidf_vectors([tokenize(item_cluster_text(representative(element))) for element in items])
+    clusters = []
+    centroids = []
+    centroid_norms = []
+    for element, vector in zip(items, vectors):
+        best_id, best_similarity = None, threshold
+        for cluster_id, centroid in enumerate(centroids):
+            if centroid_norms[cluster_id] == 0:
+                continue
+            similarity = cosine_similarity(vector, centroid) / centroid_norms[cluster_id]
+            if similarity >= best_similarity:
+                best_id, best_similarity = cluster_id, similarity
+        if best_id is None:
+            clusters.append([element])
+            centroids.append(dict(vector))
+            centroid_norms.append(1.0 if vector else 0.0)
+        else:
+            clusters[best_id].append(element)
+            centroid = centroids[best_id]
+            for token, weight in vector.items():
+                centroid[token] = centroid.get(token, 0.0) + weight
+            centroid_norms[best_id] = math.sqrt(sum(weight * weight for weight in centroid.values()))
+    for cluster in clusters:
+        cluster.sort(key=lambda element: representative(element).created_at)
+    clusters.sort(key=len, reverse=True)
+    logger.info(f"Clustered {len(items)} items into {len(clusters)} clusters.")
+    return clusters
+
+def group_str(group, need_comments=True):
+    """
+    Format a group of near-duplicate items as its representative followed by the titles and URLs of the others.
+    """
+    text = group[0].full_str(need_comments=need_comments)
+    if len(group) > 1:
+        text += "\nSimilar Items:\n" + "\n".join(f"- {item.title} ({item.url})" for item in group[1:])
+    return text
+
 def print_items(items, dump_comments=False):
     """
     Print the filtered GitHub items to stdout.
@@ -365,6 +597,9 @@ def main():
     parser.add_argument("--serving", type=str, choices=["OpenAI", "DeepSeek", "OpenRouter", "Qianfan", "Bailian", "Volces"], default="Volces", help="Which serving to be called")
     parser.add_argument("--model", type=str, default=None, help="Model to be used for summarization, None for default model of the serving provider")
     parser.add_argument("--combine-summaries", action="store_true", help="Combine summaries")
+    parser.add_argument("--cluster-items", action="store_true", help="Collapse near-duplicate items and group related items locally before summarization")
+    parser.add_argument("--dedup-threshold", type=float, default=0.8, help="Minimum estimated Jaccard similarity for items to be collapsed as near-duplicates. Only one item of a collapsed group is summarized in full, so lowering it risks dropping unrelated content")
+    parser.add_argument("--cluster-threshold", type=float, default=0.2, help="Minimum TF-IDF cosine similarity for an item to join a topic cluster")
     args = parser.parse_args()
 
     logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING), format='%(asctime)s - %(levelname)s - %(message)s')
@@ -419,7 +654,13 @@ def main():
                 print_items(filtered_items, dump_comments=args.dump_comments)
 
             if not args.no_summarize:
-                instruction = """
+                if args.cluster_items:
+                    extra_guidance = """
+Related issues and PRs are placed next to each other. "Similar Items" lists the titles and URLs of near-duplicates of an issue or PR, mention them together with it.
+"""
+                else:
+                    extra_guidance = ""
+                instruction = f"""
 You are provided with a list of GitHub issues and pull requests (PRs), each detailed with specific information in the following format:
 
 ---
@@ -465,11 +706,20 @@ In addition to these updates, ...
 
 Finally, various infrastructure updates ...
 ```
-
+{extra_guidance}
 Below is the detailed information for generating the summary:
 
     """
-                summaries = text_summarize([item.full_str(need_comments=args.dump_comments) for item in filtered_items], serving=args.serving, model=args.model, instruction=instruction)
+                if args.cluster_items:
+                    groups = dedup_items(filtered_items, threshold=args.dedup_threshold)
+                    logger.info(f"Collapsed {len(filtered_items)} items into {len(groups)} groups of near-duplicates.")
+                    clusters = cluster_items(groups, threshold=args.cluster_threshold)
+                    text_chunks = [group_str(group, need_comments=args.dump_comments) for cluster in clusters for group in cluster]
+                    chunk_groups = [cluster_id for cluster_id, cluster in enumerate(clusters) for _ in cluster]
+                else:
+                    text_chunks = [item.full_str(need_comments=args.dump_comments) for item in filtered_items]
+                    chunk_groups = None
+                summaries = text_summarize(text_chunks, serving=args.serving, model=args.model, instruction=instruction, chunk_groups=chunk_groups)
                 if args.combine_summaries:
                     combine_instruction = """
 Please combine the summaries of the individual GitHub issues and pull requests into a single blog-style summary.
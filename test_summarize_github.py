@@ -0,0 +1,169 @@
+import pytest
+
+import summarize_github
+from summarize_github import text_summarize
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    Replace token counting and the LLM call: 4 characters per token, summaries record the prompt text.
+    """
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(summarize_github, "count_tokens", lambda text: len(text) // 4)
+    batches = []
+
+    def summarize_chunk(client, model, chunk, prompt_instructions="", max_summary_tokens=None):
+        batches.append(chunk)
+        return f"summary {len(batches)}"
+
+    monkeypatch.setattr(summarize_github, "summarize_chunk", summarize_chunk)
+
+    def set_max_input_tokens(max_input_tokens):
+        monkeypatch.setitem(summarize_github.llm_max_input_tokens, "OpenAI/test-model", max_input_tokens)
+
+    return batches, set_max_input_tokens
+
+
+def test_text_summarize_packs_without_groups(fake_llm):
+    batches, set_max_input_tokens = fake_llm
+    set_max_input_tokens(1000)
+    chunks = ["a" * 1600, "b" * 2800]
+    summaries = text_summarize(chunks, serving="OpenAI", model="test-model", instruction="i" * 400)
+    assert summaries == ["summary 1"]
+    assert batches == ["\n".join(chunks)]
+
+
+def test_text_summarize_starts_new_batch_at_group_boundary(fake_llm):
+    batches, set_max_input_tokens = fake_llm
+    set_max_input_tokens(1000)
+    chunks = ["a" * 1600, "b" * 2800]
+    summaries = text_summarize(chunks, serving="OpenAI", model="test-model", instruction="i" * 400, chunk_groups=[0, 1])
+    assert summaries == ["summary 1", "summary 2"]
+    # the first chunk fits, so it is sent in full even though it is alone in its batch
+    assert batches == chunks
+
+
+def test_text_summarize_keeps_small_groups_together(fake_llm):
+    batches, set_max_input_tokens = fake_llm
+    set_max_input_tokens(1000)
+    chunks = ["a" * 800, "b" * 800, "c" * 1600, "d" * 1600, "e" * 400]
+    text_summarize(chunks, serving="OpenAI", model="test-model", instruction="i" * 400, chunk_groups=[0, 0, 1, 1, 2])
+    assert batches == ["\n".join(chunks[:2]), "\n".join(chunks[2:])]
+
+
+def test_text_summarize_truncates_oversized_chunk(fake_llm):
+    batches, set_max_input_tokens = fake_llm
+    set_max_input_tokens(1000)
+    chunks = ["a" * 8000, "b" * 400]
+    text_summarize(chunks, serving="OpenAI", model="test-model", instruction="i" * 400, chunk_groups=[0, 1])
+    assert batches == ["a" * 900, "b" * 400]
+
+
+def make_item(title, description="No description available", tags=(), created_at="2024-01-01T00:00:00", num_comments=0):
+    comments = [{"author": "user", "body": "comment", "created_at": created_at}] * num_comments
+    url = f"https://github.com/pytorch/pytorch/issues/{abs(hash((title, description, created_at))) % 100000}"
+    return summarize_github.GitHubItem(title, url, description, "user", list(tags), [], [], created_at, comments, [], "open")
+
+
+def group_titles(groups):
+    return sorted(sorted(item.title for item in group) for group in groups)
+
+
+def test_dedup_items_collapses_bot_test_families():
+    items = [
+        make_item("DISABLED test_conv2d_cuda (__main__.TestConv)"),
+        make_item("DISABLED test_linear_cpu (__main__.TestConv)"),
+        make_item("DISABLED test_linear_cpu (__main__.TestLinear)"),
+        make_item("[flaky] test_a failed on trunk 123"),
+        make_item("[flaky] test_b failed on trunk 456"),
+    ]
+    assert group_titles(summarize_github.dedup_items(items)) == [
+        ["DISABLED test_conv2d_cuda (__main__.TestConv)", "DISABLED test_linear_cpu (__main__.TestConv)"],
+        ["DISABLED test_linear_cpu (__main__.TestLinear)"],
+        ["[flaky] test_a failed on trunk 123", "[flaky] test_b failed on trunk 456"],
+    ]
+
+
+def test_dedup_items_keeps_human_titles_mentioning_flakiness_apart():
+    items = [
+        make_item("[dynamo] Fix flaky test_graph_break", "Mark the graph break counter as reset between runs."),
+        make_item("[dynamo] Fix flaky test_guards", "Guard failures depended on dict ordering."),
+        make_item("Fix flaky test for 2 GPUs", "Skip the NCCL timeout check."),
+        make_item("Fix flaky test for 8 GPUs", "Increase the rendezvous timeout."),
+    ]
+    assert len(summarize_github.dedup_items(items)) == 4
+
+
+ENVIRONMENT_DUMP = "\n".join(
+    ["### Versions", "Collecting environment information...", "PyTorch version: 2.5.0", "OS: Ubuntu 22.04.4 LTS (x86_64)"]
+    + [f"[pip3] package{i}==1.{i}.0" for i in range(60)]
+    + ["", "cc @ezyang @chauhang"]
+)
+
+
+def test_dedup_items_collapses_near_duplicates_and_picks_most_discussed():
+    description = "Workers hang forever on macOS when num_workers is above zero and pin_memory is enabled."
+    items = [
+        make_item("DataLoader hangs on macOS", description),
+        make_item("DataLoader hangs on macOS", description, num_comments=3),
+        make_item("torch.compile crashes with dynamic shapes", "Compiling with dynamic=True raises an assertion in the guard code."),
+    ]
+    groups = summarize_github.dedup_items(items)
+    assert group_titles(groups) == [["DataLoader hangs on macOS", "DataLoader hangs on macOS"], ["torch.compile crashes with dynamic shapes"]]
+    representative = next(group[0] for group in groups if len(group) == 2)
+    assert representative is items[1]
+
+
+def test_dedup_items_ignores_shared_issue_template():
+    items = [
+        make_item("torch.compile crashes with dynamic shapes", "### 🐛 Describe the bug\n\ncompile fails with dynamic=True\n\n" + ENVIRONMENT_DUMP),
+        make_item("DataLoader hangs on macOS", "### 🐛 Describe the bug\n\nworkers hang forever on mac\n\n" + ENVIRONMENT_DUMP),
+    ]
+    assert len(summarize_github.dedup_items(items)) == 2
+
+
+def test_dedup_items_compares_all_pairs_in_bucket():
+    description = "Workers hang forever on macOS when num_workers is above zero and pin_memory is enabled. " * 3
+    items = [
+        make_item("Totally unrelated title", description),
+        make_item("DataLoader hangs on macOS", description),
+        make_item("DataLoader hangs on macOS", description),
+    ]
+    assert group_titles(summarize_github.dedup_items(items)) == [
+        ["DataLoader hangs on macOS", "DataLoader hangs on macOS"],
+        ["Totally unrelated title"],
+    ]
+
+
+def test_dedup_items_keeps_cjk_and_empty_items_as_singletons():
+    items = [make_item("修复 内存 泄漏"), make_item("新增 功能 支持"), make_item("12345"), make_item("!!!"), make_item("???")]
+    assert len(summarize_github.dedup_items(items)) == 5
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    assert summarize_github.tokenize("Fix 内存泄漏 in DataLoader") == ["fix", "内存", "存泄", "泄漏", "in", "dataloader"]
+
+
+def test_cluster_items_groups_by_topic_and_orders_clusters():
+    inductor = [
+        make_item("Inductor: fuse pointwise ops into matmul epilogue", "inductor matmul epilogue fusion", ["module: inductor"], "2024-01-03T00:00:00"),
+        make_item("Inductor: matmul epilogue fusion heuristics", "inductor heuristics for matmul epilogue fusion", ["module: inductor"], "2024-01-01T00:00:00"),
+        make_item("Inductor: matmul epilogue fusion for bmm", "inductor bmm epilogue fusion", ["module: inductor"], "2024-01-02T00:00:00"),
+    ]
+    others = [
+        make_item("Docs: fix typo in README", "typo fix in readme docs"),
+        make_item("DataLoader hangs on macOS", "workers hang forever"),
+        make_item("Add bfloat16 support to sparse addmm", "sparse kernels"),
+    ]
+    groups = [[others[0]], [inductor[0]], [others[1]], [inductor[1]], [inductor[2]], [others[2]]]
+    clusters = summarize_github.cluster_items(groups)
+    # largest cluster first, items in a cluster by creation time
+    assert clusters == [[[inductor[1]], [inductor[2]], [inductor[0]]], [[others[0]]], [[others[1]]], [[others[2]]]]
+
+
+def test_group_str_lists_titles_of_collapsed_items():
+    items = [make_item("DISABLED test_a (__main__.TestFoo)"), make_item("DISABLED test_b (__main__.TestFoo)")]
+    text = summarize_github.group_str(items, need_comments=False)
+    assert text.startswith(items[0].full_str(need_comments=False))
+    assert text.endswith(f"\nSimilar Items:\n- DISABLED test_b (__main__.TestFoo) ({items[1].url})")